@@ -7,7 +7,11 @@ class Particle:
 
         self.position = position
         self.velocity = velocity
-        self.bestp = position
+        # bestp must not share memory with position, otherwise any in place update of position would silently change it
+        self.bestp = np.array(position, dtype=float)
+
+        # number of components of the particle, computed once instead of at every update
+        self.D = len(position)
 
         self.iteration = 0
 
@@ -33,22 +37,22 @@ class Particle:
 
         min_w = (c1+c2)*(1/2)-1
         
-        if schedule_type == 'costant':
+        if schedule_type == 'constant':
             # w is set to be constant
-            w = c1*random_1 + c2*random_2
+            w = old_w
 
         if schedule_type == 'random':
             # w is randomly selected ad each iteration from a gaussian distribution with center 0.72 and σ small enough to ensure that w is not predominantly greater than one
             w = np.random.normal(0.72, 0.4)
 
         if schedule_type == 'linearly decreasing':
-            if max_iter != None:
+            if max_iter is not None:
                 w = ((0.9-min_w)*(max_iter-self.iteration)/max_iter) + min_w
             else: 
                 raise Exception('ERROR YOU MUST SPECIFY THE MAXIMUM NUMBER OF ITERATION')
         
         if schedule_type == 'nonlinearly decreasing':
-            if old_w != None:
+            if old_w is not None:
                 w = 0.975*old_w
             else: 
                 raise Exception('ERROR YOU MUST SPECIFY W AT PREVIOUS ITERATION')
@@ -72,25 +76,18 @@ class Particle:
            w: positive constant value. Float type (is the starting value for w)
            v_max: vector (each element is the maximum velocity for that dimension)'''
 
-        random_1 = np.random.random(len(self.position))
-        random_2 = np.random.random(len(self.position))
+        random_1 = np.random.random(self.D)
+        random_2 = np.random.random(self.D)
 
         velocity = w*self.velocity + c1*random_1*(self.bestp - self.position) + c2*random_2*(best_glob_pos - self.position)
 
         # velocity quickly explodes to large values, especially for particles far from the neighborhood best and personal best positions. Consequently, particles have large position updates, which result in particles leaving the boundaries of the search space – the particles diverge. To control the global exploration of particles, velocities are clamped to stay within boundary constraints.
 
-        if v_max != None:
-            new_velocity = np.zeros(len(velocity)) #I inizialize an array with all zeros and then I change the elements
-
-            for i in range (len(velocity)):
-                if velocity[i] > v_max[i]:
-                    new_velocity[i] = v_max[i]
-                else:
-                    new_velocity[i] = velocity[i]
-            self.velocity = new_velocity
+        if v_max is not None:
+            v_max = np.asarray(v_max)
+            np.clip(velocity, -v_max, v_max, out=velocity)
 
-        else:
-            self.velocity = velocity
+        self.velocity = velocity
         
         #let's update w
         w = self.inertia_coefficient(c1, c2, random_1, random_2, old_w = w, schedule_type = w_schedule)
@@ -104,30 +101,25 @@ class Particle:
         2) absorbing: a particle flying outside of a parameter’s boundary is relocated at the boundary in that dimension.
         3) reflecting: when a particle flies outside of a boundary of a parameter, the boundary acts like a mirror and reflects the projection of the particle’s displacement'''
         
-        new_position = []
-
-        # we iterate for each component of the position
-        for dim, lower, upper in zip(self.position, lower_bound, upper_bound):
-            
-            while ((dim < lower) or (dim > upper)): #check if in that dimension the position component is outside of the boundary
-
-                if scheme == 'random':
-                    dim = np.random.uniform(lower, upper)
-
-                elif scheme == 'absorbing':
-                    if dim < lower:
-                        dim = lower
-                    else:
-                        dim = upper
-                
-                elif scheme == 'reflecting':
-                    if dim < lower:
-                        dim = (lower - dim) + lower
-                    else:
-                        dim = upper - (dim-upper)
-                
-            new_position.append(dim)
-        self.position = np.array(new_position)
+        lower_bound = np.asarray(lower_bound, dtype=float)
+        upper_bound = np.asarray(upper_bound, dtype=float)
+
+        # every scheme is applied to all the components at once, without branching on each of them
+        if scheme == 'random':
+            outside = (self.position < lower_bound) | (self.position > upper_bound)
+            self.position = np.where(outside, np.random.uniform(lower_bound, upper_bound), self.position)
+
+        elif scheme == 'absorbing':
+            self.position = np.clip(self.position, lower_bound, upper_bound)
+
+        elif scheme == 'reflecting':
+            # the reflections between the two boundaries repeat with period 2*range, so the final position has a closed form
+            r2 = 2*(upper_bound - lower_bound)
+            t = np.mod(self.position - lower_bound, r2)
+            self.position = lower_bound + np.minimum(t, r2 - t)
+
+        else:
+            raise Exception('You must specify a valid boundary scheme')
 
     def BestLocal(self, problem):
         '''Takes as input the particle and the type of optimization problem (problem could be minimum or maximum) and calculates best fitness and best position'''
@@ -137,11 +129,11 @@ class Particle:
         if problem == 'minimum':
             if self.fitness < self.bestfit:
                 self.bestfit = self.fitness
-                self.bestp = self.position
+                np.copyto(self.bestp, self.position)
         elif problem == 'maximum':
             if self.fitness > self.bestfit:
                 self.bestfit = self.fitness
-                self.bestp = self.position
+                np.copyto(self.bestp, self.position)
         else:
             return "Error! problem must be: 'minimum' or 'maximum'"    
         return self
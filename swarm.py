@@ -0,0 +1,389 @@
+import numpy as np
+
+try:
+    from numba import literally, njit, prange
+except ImportError:
+    # numba is optional: without it the same step is carried out with plain numpy operations.
+    njit = None
+
+
+# Size in bytes of the rows of X, V and P processed together by _pso_step_numpy, chosen so that they stay in the L2 cache.
+_TILE_BYTES = 128*1024
+
+
+def _pso_step_numpy(X, V, P, G, w, c1, c2, lower, upper, vmax, R1, R2, T, scheme = 'reflecting', clamp = True):
+    '''Velocity update, velocity clamping, position update and boundary constraints over the whole swarm.
+       X, V, P, R1, R2 have shape (N, D) and X, V are updated in place; G, lower, upper, vmax have shape (D,).
+       T is a scratch array of shape (N, D): every operation writes into V, X or T, so no temporary array is allocated.
+       The particles are processed in blocks of rows small enough to stay in cache while all the operations are applied to them.
+       scheme: 'reflecting' or 'absorbing'. With 'random' the positions are left outside the boundaries, and the caller applies the scheme.
+       clamp: if False the velocities are not clamped to vmax.'''
+
+    N, D = X.shape
+    tile = max(1, _TILE_BYTES // (3*D*X.itemsize))
+    r2 = 2*(upper - lower)
+
+    for start in range(0, N, tile):
+        sl = slice(start, start + tile)
+        Xt, Vt, Tt = X[sl], V[sl], T[sl]
+
+        Vt *= w
+        np.subtract(P[sl], Xt, out=Tt)
+        Tt *= R1[sl]
+        Tt *= c1
+        Vt += Tt
+        np.subtract(G, Xt, out=Tt)
+        Tt *= R2[sl]
+        Tt *= c2
+        Vt += Tt
+        if clamp:
+            np.clip(Vt, -vmax, vmax, out=Vt)
+        Xt += Vt
+
+        if scheme == 'reflecting':
+            np.subtract(Xt, lower, out=Tt)
+            np.mod(Tt, r2, out=Tt)
+            np.subtract(r2, Tt, out=Xt)
+            np.minimum(Tt, Xt, out=Xt)
+            Xt += lower
+        elif scheme == 'absorbing':
+            np.clip(Xt, lower, upper, out=Xt)
+
+
+# Boundary schemes supported by the swarm step.
+_SCHEMES = ('reflecting', 'absorbing', 'random')
+
+
+if njit is not None:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _pso_step_kernel(X, V, P, G, w, c1, c2, lower, upper, vmax, R1, R2, T, scheme, clamp):
+        '''Same as _pso_step_numpy, compiled by numba: every element is updated in a single pass and the particles are split among threads.
+           The scratch array T and the blocking are not needed here, since each row is read and written only once.
+           scheme and clamp are compile time constants (numba.literally): numba compiles, and caches on disk, one version for each combination,
+           where the branches on them are removed.'''
+
+        literally(scheme)
+        literally(clamp)
+
+        N, D = X.shape
+        for i in prange(N):
+            for j in range(D):
+                v = w*V[i, j] + c1*R1[i, j]*(P[i, j] - X[i, j]) + c2*R2[i, j]*(G[j] - X[i, j])
+                if clamp:
+                    v = min(max(v, -vmax[j]), vmax[j])
+                V[i, j] = v
+                x = X[i, j] + v
+
+                if scheme == 'reflecting':
+                    r2 = 2*(upper[j] - lower[j])
+                    t = (x - lower[j]) % r2
+                    X[i, j] = lower[j] + min(t, r2 - t)
+                elif scheme == 'absorbing':
+                    X[i, j] = min(max(x, lower[j]), upper[j])
+                else:
+                    # the random scheme needs the swarm generator, so it is applied after the kernel by Swarm.BoundaryConstraints
+                    X[i, j] = x
+
+
+def _make_step(scheme, clamp, xp = np):
+    '''Returns the swarm step specialized for a boundary scheme and for the presence of the velocity clamping.
+       It runs the numba kernel when numba is available and the arrays are numpy arrays, _pso_step_numpy otherwise
+       (with cupy arrays its numpy calls are dispatched to cupy).'''
+
+    kernel = _pso_step_kernel if njit is not None and xp is np else _pso_step_numpy
+
+    def step(X, V, P, G, w, c1, c2, lower, upper, vmax, R1, R2, T):
+        kernel(X, V, P, G, w, c1, c2, lower, upper, vmax, R1, R2, T, scheme, clamp)
+
+    return step
+
+
+def _aligned_empty(shape, dtype, align = 64):
+    '''Returns an empty C-contiguous numpy array whose data starts at an address multiple of align bytes (a cache line),
+       so that the vectorized loops of numpy and numba can use aligned SIMD loads.'''
+
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    buffer = np.empty(nbytes + align, dtype=np.uint8)
+    offset = (-buffer.ctypes.data) % align
+    return buffer[offset:offset + nbytes].view(dtype).reshape(shape)
+
+
+# Strategies for the inertia coefficient w. Each one takes (rng, iteration, max_iter, old_w, min_w) and returns the new w.
+_W_SCHEDULES = {
+    # w is kept constant at its starting value
+    'constant': lambda rng, iteration, max_iter, old_w, min_w: old_w,
+    # w is randomly selected ad each iteration from a gaussian distribution with center 0.72 and σ small enough to ensure that w is not predominantly greater than one
+    'random': lambda rng, iteration, max_iter, old_w, min_w: 0.72 + 0.4*rng.standard_normal(),
+    'linearly decreasing': lambda rng, iteration, max_iter, old_w, min_w: ((0.9-min_w)*(max_iter-iteration)/max_iter) + min_w,
+    'nonlinearly decreasing': lambda rng, iteration, max_iter, old_w, min_w: 0.975*old_w,
+}
+
+
+class Swarm:
+
+    def __init__(self, positions, velocities, w_schedule = 'constant', w = 0.9, max_iter = None, scheme = 'reflecting', problem = 'minimum', seed = None, dtype = np.float32, xp = np):
+        '''positions and velocities are matrices (numpy array) of shape (N, D): the i-th row is the position (velocity) of the i-th particle.
+           The whole swarm is stored as a structure of arrays, so every update is a single numpy operation over all the particles.
+           w_schedule: strategy you want to use to compute the inertia coefficient in PSO.
+           It can be <<constant>>, <<random>>, <<linearly decreasing>>, <<nonlinearly decreasing>>
+           w: positive constant value. Float type (is the starting value for w)
+           max_iter: (Optional) maximum number of iteration, needed by <<linearly decreasing>>. Integer type
+           scheme: scheme used for the boundary constraints: <<reflecting>>, <<absorbing>> or <<random>> (see BoundaryConstraints)
+           problem: type of optimization problem, 'minimum' or 'maximum'
+           seed: (Optional) seed of the random generator shared by the whole swarm.
+           dtype: floating point type of positions, velocities and best positions. PSO is stochastic and does not need double precision,
+                  so float32 is used by default: it halves the memory moved at each iteration. Fitness values are always stored as float64.
+           xp: array module where the swarm arrays live. It can be numpy (default) or cupy, to run the updates on the GPU:
+               this pays off only for large swarms (N*D above ~1e5). With cupy the fitness must be batched: it receives the (N, D) cupy array of positions
+               and returns an (N,) cupy array, so the swarm never goes through the host.'''
+
+        # The schedule is resolved once here, so the update of w is a single direct call at each iteration.
+        if w_schedule not in _W_SCHEDULES:
+            raise Exception('You must specify a valid type for w')
+        if w_schedule == 'linearly decreasing' and max_iter is None:
+            raise Exception('ERROR YOU MUST SPECIFY THE MAXIMUM NUMBER OF ITERATION')
+        self._w_fn = _W_SCHEDULES[w_schedule]
+        self.w = w
+        self.max_iter = max_iter
+
+        if scheme not in _SCHEMES:
+            raise Exception('You must specify a valid boundary scheme')
+        self.scheme = scheme
+        # step specialized for the boundary scheme and the array module, without and with the velocity clamping
+        self._steps = {clamp: _make_step(scheme, clamp, xp) for clamp in (False, True)}
+
+        if problem not in ('minimum', 'maximum'):
+            raise Exception("Error! problem must be: 'minimum' or 'maximum'")
+        self.problem = problem
+
+        self.N, self.D = np.shape(positions)
+        self.dtype = np.dtype(dtype)
+        self.xp = xp
+
+        # numpy arrays are aligned to the cache line; cupy allocations are already aligned by its memory pool
+        empty = _aligned_empty if xp is np else xp.empty
+
+        self.positions = empty((self.N, self.D), self.dtype)
+        self.velocities = empty((self.N, self.D), self.dtype)
+        self.bestp = empty((self.N, self.D), self.dtype)
+        self.fitness = empty((self.N,), np.float64)
+        self.bestfit = empty((self.N,), np.float64)
+        # the worst possible fitness, so the first evaluation always becomes the best local one
+        self.bestfit[:] = np.inf if problem == 'minimum' else -np.inf
+        # scratch array used to update the swarm in place, without allocating temporaries at each iteration
+        self._tmp = empty((self.N, self.D), self.dtype)
+        # buffer refilled at each iteration with the two random matrices of the velocity update
+        self._R = empty((2, self.N, self.D), self.dtype)
+
+        self.positions[:] = xp.asarray(positions)
+        self.velocities[:] = xp.asarray(velocities)
+        self.bestp[:] = self.positions
+
+        self.rng = xp.random.default_rng(seed)
+        # scalar draws (the random w schedule) are made on the host, so reading them does not wait for the GPU
+        self._host_rng = self.rng if xp is np else np.random.default_rng(seed)
+
+        self.iteration = 0
+
+
+    def _vector(self, value):
+        '''Returns value (a scalar or a vector) as a contiguous array of shape (D,) with the swarm dtype, allocated with the swarm array module.'''
+
+        vector = self.xp.empty(self.D, dtype=self.dtype)
+        vector[...] = self.xp.asarray(value, dtype=self.dtype)
+        return vector
+
+    def FitnessCalculator(self, accuracy, batched = False):
+        '''Computes the fitness of every particle of the swarm and stores it in self.fitness (shape (N,)).
+           accuracy: function that computes the fitness of a particle. It takes a position (numpy array of shape (D,)) as argument and returns the relative fitness (a float value)
+           batched: if True, accuracy is called only once on the whole swarm: it takes the positions (numpy array of shape (N, D)) and returns the fitness of every particle (numpy array of shape (N,)).
+                    Use it when the fitness can be computed with numpy operations (e.g. sphere, Rosenbrock, Rastrigin functions).'''
+
+        if batched:
+            self.fitness[:] = accuracy(self.positions)
+        elif self.xp is not np:
+            raise Exception('With cupy the fitness must be computed on the whole swarm: use batched = True')
+        else:
+            self.fitness[:] = self.xp.asarray(np.fromiter((accuracy(position) for position in self.positions), dtype=float, count=self.N))
+        return self
+
+    def inertia_coefficient(self, c1, c2):
+        '''Computes the inertia coefficient (typically named w) for the next iteration, stores it in self.w and returns it.
+           w is the same for the whole swarm, so it is computed once per iteration.
+           c1: positive costant value. Float type
+           c2: positive constant value. Float type'''
+
+        min_w = (c1+c2)*(1/2)-1
+
+        w = self._w_fn(self._host_rng, self.iteration, self.max_iter, self.w, min_w)
+
+        # w > min_w guarantees convergent particle trajectories. If this condition is not satisfied, divergent or cyclic behavior may occur.
+        self.w = max(float(w), min_w)
+        return self.w
+
+
+    def VelocityCalculator(self, c1, c2, best_glob_pos, v_max = None):
+        '''Computes and update the velocities of the whole swarm, using the current inertia coefficient self.w.
+           c1: positive costant value. Float type
+           c2: positive constant value. Float type
+           best_glob_pos: numpy array of shape (D,)
+           v_max: vector (each element is the maximum velocity for that dimension)'''
+
+        # the random numbers of the whole swarm are drawn with a single call, into the preallocated buffer
+        self.rng.random(dtype=self.dtype, out=self._R)
+        random_1, random_2 = self._R[0], self._R[1]
+
+        # velocities = w*velocities + c1*random_1*(bestp - positions) + c2*random_2*(best_glob_pos - positions), computed in place.
+        # best_glob_pos has shape (D,) and is broadcast over the N rows.
+        best_glob_pos = self._vector(best_glob_pos)
+        self.velocities *= self.w
+        np.subtract(self.bestp, self.positions, out=self._tmp)
+        self._tmp *= random_1
+        self._tmp *= c1
+        self.velocities += self._tmp
+        np.subtract(best_glob_pos, self.positions, out=self._tmp)
+        self._tmp *= random_2
+        self._tmp *= c2
+        self.velocities += self._tmp
+
+        # velocities are clamped to stay within boundary constraints (see Particle.VelocityCalculator).
+        if v_max is not None:
+            v_max = self._vector(v_max)
+            np.clip(self.velocities, -v_max, v_max, out=self.velocities)
+
+        #let's update w
+        self.inertia_coefficient(c1, c2)
+
+        return self
+
+    def BoundaryConstraints(self, lower_bound, upper_bound, scheme = None):
+        '''This function calculates the new positions of the particles that are outside the boundary.
+        Three main scheme are take in account:
+        1) random:  if a particle flies outside of the boundary of a parameter, a random value drawn from a uniform distribution between the lower and upper boundaries of the parameter is assigned.
+        2) absorbing: a particle flying outside of a parameter’s boundary is relocated at the boundary in that dimension.
+        3) reflecting: when a particle flies outside of a boundary of a parameter, the boundary acts like a mirror and reflects the projection of the particle’s displacement
+        If scheme is not given, the scheme of the swarm is used.'''
+
+        if scheme is None:
+            scheme = self.scheme
+
+        # lower and upper have shape (D,) and are broadcast over the N rows.
+        lower = self._vector(lower_bound)
+        upper = self._vector(upper_bound)
+
+        if scheme == 'random':
+            oob = (self.positions < lower) | (self.positions > upper)
+            # a uniform value in [lower, upper) is drawn for every component and copied only where it is outside the boundaries:
+            # a masked copy, unlike boolean indexing, does not need the number of selected components on the host
+            self.rng.random(dtype=self.dtype, out=self._tmp)
+            self._tmp *= upper - lower
+            self._tmp += lower
+            self.xp.copyto(self.positions, self._tmp, where=oob)
+
+        elif scheme == 'absorbing':
+            np.clip(self.positions, lower, upper, out=self.positions)
+
+        elif scheme == 'reflecting':
+            # Reflecting back and forth between the two boundaries is periodic with period 2*range,
+            # so the final position is obtained in closed form however far the particle overshoots.
+            r2 = 2*(upper - lower)
+            np.subtract(self.positions, lower, out=self._tmp)
+            np.mod(self._tmp, r2, out=self._tmp)
+            np.subtract(r2, self._tmp, out=self.positions)
+            np.minimum(self._tmp, self.positions, out=self.positions)
+            self.positions += lower
+
+        else:
+            raise Exception('You must specify a valid boundary scheme')
+        return self
+
+    def BestLocal(self):
+        '''Updates best fitness and best position of every particle, according to the type of optimization problem of the swarm.
+           The improved particles are selected with a mask, so the whole swarm is updated with two masked copies.
+           It also finds the global best of the swarm: its index self.gbest_idx, its position self.gbest and its fitness self.gbestfit.
+           self.gbest is a new copy at every call, so the global best positions stored by the caller are not changed by later updates of self.bestp.
+           With cupy gbest_idx and gbestfit are 0-d device arrays, so that no synchronization with the host happens at each iteration.'''
+
+        if self.problem == 'minimum':
+            improved = self.fitness < self.bestfit
+            self.xp.copyto(self.bestfit, self.fitness, where=improved)
+            gi = self.xp.argmin(self.bestfit)
+        else:
+            improved = self.fitness > self.bestfit
+            self.xp.copyto(self.bestfit, self.fitness, where=improved)
+            gi = self.xp.argmax(self.bestfit)
+
+        self.xp.copyto(self.bestp, self.positions, where=improved[:, None])
+
+        # the global best is found right after the update, so no other pass over the fitness is needed to get it
+        self.gbest_idx = gi
+        self.gbest = self.bestp[gi].copy()
+        self.gbestfit = self.bestfit[gi]
+        return self
+
+    def PositionCalculator(self, lower_bound, upper_bound, evaluation_funct, batched = False):
+        '''Calculates the new positions and the relative fitness and in case update the best local positions.
+
+        lower_bound: is a vector in which the i-th element is the lower bound of the position for the i-th dimension
+        upper_bound: is a vector in which the i-th element is the upper bound of the position for the i-th dimension
+        evaluation_funct: is the function used for evaluating the goodness of a position
+        batched: if True, evaluation_funct takes the positions of the whole swarm (see FitnessCalculator).'''
+
+        self.iteration += 1
+
+        # First we calculate the new positions
+        self.positions += self.velocities
+
+        #Then we check if the new positions are inside the boundaries
+        self.BoundaryConstraints(lower_bound, upper_bound)
+
+        # We need to calculate the fitness function for the new positions
+        self.FitnessCalculator(evaluation_funct, batched)
+
+        # With the new positions calculated we have to update the local best positions:
+        self.BestLocal()
+
+        return self
+
+    def step(self, c1, c2, best_glob_pos, lower_bound, upper_bound, evaluation_funct, v_max = None, batched = False):
+        '''Performs a whole iteration of the swarm: new velocities, new positions inside the boundaries (with the boundary scheme of the swarm), fitness and best local positions.
+           It is equivalent to VelocityCalculator followed by PositionCalculator, but velocities, positions and boundaries are updated in a single pass over the particles,
+           compiled with numba when available.
+           c1: positive costant value. Float type
+           c2: positive constant value. Float type
+           best_glob_pos: numpy array of shape (D,)
+           lower_bound: is a vector in which the i-th element is the lower bound of the position for the i-th dimension
+           upper_bound: is a vector in which the i-th element is the upper bound of the position for the i-th dimension
+           evaluation_funct: is the function used for evaluating the goodness of a position
+           v_max: vector (each element is the maximum velocity for that dimension)
+           batched: if True, evaluation_funct takes the positions of the whole swarm (see FitnessCalculator).'''
+
+        # the random numbers of the whole swarm are drawn with a single call, into the preallocated buffer
+        self.rng.random(dtype=self.dtype, out=self._R)
+        random_1, random_2 = self._R[0], self._R[1]
+
+        lower = self._vector(lower_bound)
+        upper = self._vector(upper_bound)
+        vmax = self._vector(np.inf if v_max is None else v_max)
+        best_glob_pos = self._vector(best_glob_pos)
+        # the coefficients are cast to the swarm dtype, so the compiled kernel does not promote float32 arrays to float64
+        dtype_w, dtype_c1, dtype_c2 = self.dtype.type(self.w), self.dtype.type(c1), self.dtype.type(c2)
+
+        if self.xp is np:
+            # the swarm arrays are only updated in place, so they keep the contiguous layout they were allocated with
+            assert self.positions.flags['C_CONTIGUOUS'] and self.velocities.flags['C_CONTIGUOUS'] and self.bestp.flags['C_CONTIGUOUS']
+        self._steps[v_max is not None](self.positions, self.velocities, self.bestp, best_glob_pos, dtype_w, dtype_c1, dtype_c2, lower, upper, vmax, random_1, random_2, self._tmp)
+
+        if self.scheme == 'random':
+            self.BoundaryConstraints(lower, upper)
+
+        #let's update w
+        self.inertia_coefficient(c1, c2)
+        self.iteration += 1
+
+        # fitness and best local positions are computed on the positions just written, in the same call
+        self.FitnessCalculator(evaluation_funct, batched)
+        self.BestLocal()
+
+        return self
@@ -0,0 +1,18 @@
+import numpy as np
+
+from particle import Particle
+
+
+def test_integer_position():
+    '''A particle started from an integer position must keep a float best position, separate from its position,
+       so that BestLocal can copy a non integer improved position into it.'''
+
+    p = Particle(np.array([1, 2, 3]), np.full(3, -0.5))
+    sphere = lambda position: float((position**2).sum())
+    p.FitnessCalculator(p.position, sphere).BestLocal('minimum')
+
+    p.PositionCalculator(-5*np.ones(3), 5*np.ones(3), sphere, 'minimum')
+
+    assert p.bestp.dtype == float
+    assert not np.shares_memory(p.bestp, p.position)
+    np.testing.assert_array_equal(p.bestp, [0.5, 1.5, 2.5])
@@ -0,0 +1,147 @@
+from functools import partial
+
+import numpy as np
+import pytest
+
+import swarm
+from swarm import Swarm
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+@pytest.mark.parametrize('clamp', [False, True])
+@pytest.mark.parametrize('scheme', ['reflecting', 'absorbing', 'random'])
+def test_step_matches_numpy(scheme, clamp, dtype):
+    '''Every specialized step must give the same velocities and positions as _pso_step_numpy on the same inputs.'''
+
+    # without numba _make_step runs _pso_step_numpy itself, and the comparison would check nothing
+    pytest.importorskip('numba')
+
+    N, D = 64, 5
+    rng = np.random.default_rng(0)
+    lower = np.full(D, -5, dtype=dtype)
+    upper = np.full(D, 5, dtype=dtype)
+    vmax = np.full(D, 3, dtype=dtype)
+    P = rng.uniform(-5, 5, (N, D)).astype(dtype)
+    G = P[0].copy()
+    R1, R2 = rng.random((2, N, D), dtype=dtype)
+    X = rng.uniform(-5, 5, (N, D)).astype(dtype)
+    V = rng.normal(0, 20, (N, D)).astype(dtype)
+    w, c1, c2 = dtype(0.7), dtype(1.5), dtype(1.5)
+
+    X_numpy, V_numpy = X.copy(), V.copy()
+    swarm._pso_step_numpy(X_numpy, V_numpy, P, G, w, c1, c2, lower, upper, vmax, R1, R2, np.empty_like(X), scheme, clamp)
+
+    X_step, V_step = X.copy(), V.copy()
+    swarm._make_step(scheme, clamp)(X_step, V_step, P, G, w, c1, c2, lower, upper, vmax, R1, R2, np.empty_like(X))
+
+    tol = 1e-4 if dtype == np.float32 else 1e-10
+    np.testing.assert_allclose(V_step, V_numpy, rtol=tol, atol=tol)
+    np.testing.assert_allclose(X_step, X_numpy, rtol=tol, atol=tol)
+    if scheme != 'random':
+        assert (X_step >= lower).all() and (X_step <= upper).all()
+
+
+@pytest.mark.parametrize('step', [partial(swarm._pso_step_numpy, scheme='reflecting', clamp=False), swarm._make_step('reflecting', False)], ids=['numpy', 'make_step'])
+def test_reflecting_known_values(step):
+    '''With the boundaries [0, 1] a particle moving from 0 to 1.3 is reflected to 0.7, and one moving to -2.3 bounces several times and ends at 0.3.'''
+
+    X = np.zeros((3, 1))
+    V = np.array([[1.3], [-2.3], [0.4]])
+    zero, one = np.zeros(1), np.ones(1)
+    R = np.zeros((3, 1))
+    # w = 1 and c1 = c2 = 0, so each particle moves exactly by its velocity
+    step(X, V, X.copy(), zero, 1.0, 0.0, 0.0, zero, one, np.full(1, np.inf), R, R, np.empty_like(X))
+
+    np.testing.assert_allclose(X[:, 0], [0.7, 0.3, 0.4], atol=1e-12)
+
+
+def sphere(X):
+    return (X**2).sum(axis=1)
+
+
+def test_gbest_is_a_copy():
+    '''A global best position kept by the caller must not change when that particle improves in a later step.'''
+
+    positions = np.array([[1.0, 1.0], [4.0, 4.0], [-3.0, 4.0]])
+    # only the best particle moves, towards the minimum of the sphere
+    velocities = np.array([[-0.5, -0.5], [0.0, 0.0], [0.0, 0.0]])
+    s = Swarm(positions, velocities, w=1.0, seed=0, dtype=np.float64)
+    s.FitnessCalculator(sphere, batched=True).BestLocal()
+    assert s.gbest_idx == 0
+
+    kept, kept_fit = s.gbest, s.gbestfit
+    s.step(1.5, 1.5, s.gbest, -5*np.ones(2), 5*np.ones(2), sphere, batched=True)
+
+    assert s.gbest_idx == 0 and s.gbestfit < kept_fit
+    np.testing.assert_array_equal(kept, [1.0, 1.0])
+    assert not np.shares_memory(s.gbest, s.bestp)
+
+
+def test_gbest_maximum():
+    '''With problem = 'maximum' the global best is the particle with the largest fitness.'''
+
+    positions = np.array([[1.0, 1.0], [4.0, 4.0], [-3.0, 4.0]])
+    s = Swarm(positions, np.zeros((3, 2)), problem='maximum', dtype=np.float64)
+    s.FitnessCalculator(sphere, batched=True).BestLocal()
+
+    assert s.gbest_idx == 1 and s.gbestfit == 32.0
+    np.testing.assert_array_equal(s.gbest, [4.0, 4.0])
+
+
+def test_fitness_batched_matches_per_particle():
+    '''The batched fitness, computed on the whole swarm at once, must be identical to the one computed particle by particle.'''
+
+    rng = np.random.default_rng(0)
+    s = Swarm(rng.uniform(-5, 5, (64, 5)), np.zeros((64, 5)), dtype=np.float64)
+
+    s.FitnessCalculator(lambda position: float((position**2).sum()))
+    per_particle = s.fitness.copy()
+    s.FitnessCalculator(sphere, batched=True)
+
+    np.testing.assert_array_equal(s.fitness, per_particle)
+
+
+@pytest.mark.parametrize('problem', ['minimum', 'maximum'])
+def test_best_local_updates_improved_rows(problem):
+    '''BestLocal must change bestp and bestfit only for the particles whose fitness improved.'''
+
+    positions = np.array([[1.0, 1.0], [4.0, 4.0], [-3.0, 4.0], [2.0, 0.0]])
+    s = Swarm(positions, np.zeros((4, 2)), problem=problem, dtype=np.float64)
+    s.FitnessCalculator(sphere, batched=True).BestLocal()
+    bestp, bestfit = s.bestp.copy(), s.bestfit.copy()
+
+    # particles 0 and 2 get closer to the origin, particles 1 and 3 get farther
+    s.positions[:] = [[0.5, 0.5], [5.0, 5.0], [-1.0, 1.0], [3.0, 0.0]]
+    s.FitnessCalculator(sphere, batched=True).BestLocal()
+
+    improved = [True, False, True, False] if problem == 'minimum' else [False, True, False, True]
+    for i, changed in enumerate(improved):
+        if changed:
+            np.testing.assert_array_equal(s.bestp[i], s.positions[i])
+            assert s.bestfit[i] == sphere(s.positions[i:i+1])[0]
+        else:
+            np.testing.assert_array_equal(s.bestp[i], bestp[i])
+            assert s.bestfit[i] == bestfit[i]
+
+
+@pytest.mark.parametrize('scheme', ['reflecting', 'absorbing', 'random'])
+def test_swarm_cupy(scheme):
+    '''A swarm on the GPU goes through fitness, best local positions and a few steps and stays inside the boundaries.'''
+
+    cupy = pytest.importorskip('cupy')
+
+    N, D = 64, 5
+    rng = np.random.default_rng(0)
+    lower, upper = -5*np.ones(D), 5*np.ones(D)
+
+    s = Swarm(cupy.asarray(rng.uniform(-5, 5, (N, D))), cupy.asarray(rng.normal(0, 2, (N, D))), scheme=scheme, seed=0, xp=cupy)
+    s.FitnessCalculator(sphere, batched=True).BestLocal()
+    start = float(s.gbestfit)
+    for _ in range(5):
+        s.step(1.5, 1.5, s.gbest, lower, upper, sphere, v_max=3*np.ones(D), batched=True)
+
+    assert isinstance(s.positions, cupy.ndarray) and isinstance(s.gbest, cupy.ndarray)
+    positions = cupy.asnumpy(s.positions)
+    assert (positions >= lower).all() and (positions <= upper).all()
+    np.testing.assert_allclose(cupy.asnumpy(s.fitness), sphere(positions.astype(np.float64)), rtol=1e-5)
+    assert float(s.gbestfit) <= start